@@ -7,23 +7,48 @@
 # 		1.0     15/03/2012  Initial Version
 
 
-import re, csv, collections, sys, inspect, time
+import csv, collections, sys, os, time, mmap, array, functools
 from progressbar import *
 
+# Use orjson's C parser where available, otherwise the stdlib json module
+try:
+    import orjson
+    HAVEORJSON = True
+except ImportError:
+    import json as orjson
+    HAVEORJSON = False
+
+# Optional compiled fast path for the scanner's per-byte state machine
+try:
+    import numpy
+    from numba import njit
+except ImportError:
+    numpy = njit = None
+
 # Debugging and user feedback options
-LOOPFEEDBACK = 10
 DEBUGLEVEL = 1
 
 # Which fields do we want to capture
 FIELDS = ['lastUpdated','url','title','ID','referrer','scroll','subframe','Path']
 
+# The blob is scanned as bytes (no UTF-8 decode pass); name the byte
+# values and key literals the scanner cares about
+_URL_KEY = b'"url":'
+_LASTUPDATE_KEY = b'lastUpdate'
+_QUOTE, _BACKSLASH = ord('"'), ord('\\')
+_OPEN_BRACE, _CLOSE_BRACE = ord('{'), ord('}')
+_OPEN_BRACKET, _CLOSE_BRACKET = ord('['), ord(']')
+
 
 """
 Converts an UNIX date-time integer into a string in an excel-friendly format
 Time is seconds since 1/1/1970
+Cached: localtime/strftime are expensive C crossings (DST rule lookups),
+and repeated timestamps are the common case
 """
+@functools.lru_cache(maxsize=1024)
 def intUnixMSToDateTime(intUnixDateTime):
-    inLocal = time.localtime(intUnixDateTime/1000)
+    inLocal = time.localtime(intUnixDateTime//1000)
     return time.strftime("%d-%b-%Y %H:%M:%S",inLocal)
 
 
@@ -41,169 +66,418 @@ def openFile(fileName, openType, defaultFile=sys.stdout,newline='\n'):
 
 """ Print a debug message if the current DEBUGLEVEL is set, including the calling function """
 def debugMessage(message, messageDebugLevel = 10):
-        if DEBUGLEVEL >= messageDebugLevel:
-                indent = "  " * len(inspect.stack())
-                print("%s%s: %s" % (indent, whoParent(), message), file=sys.stderr)
-
-""" Return the name of the current function """                
+        # Bail out before any frame introspection - this gets called in hot
+        # loops, and inspect.stack() materialises the whole frame chain
+        if DEBUGLEVEL < messageDebugLevel:
+                return
+        frame = sys._getframe(1)
+        caller = frame.f_code.co_name
+        depth = 1       # count this frame too, as inspect.stack() did
+        while frame != None:
+                depth += 1
+                frame = frame.f_back
+        print("%s%s: %s" % ("  " * depth, caller, message), file=sys.stderr)
+
+""" Return the name of the current function """
 def whoAmI():
-        return inspect.stack()[1][3]
+        return sys._getframe(1).f_code.co_name
 
 """ Return the name of the parent function"""
 def whoParent():
-        return inspect.stack()[2][3]
+        return sys._getframe(2).f_code.co_name
     
 
 class csvWriter:
-    fields = []
-    _outFile = None
-    _outWriter = None
-    
+    __slots__ = ('_fields', '_outFile', '_outWriter', '_buf')
+
+    # How many rows to buffer before handing them to writerows in one go
+    FLUSHEVERY = 1024
+
     def __init__(self, fields, outFile, mode='w'):
-        # Setup CSV File
+        # Setup CSV File - DictWriter does the dict->row ordering in C,
+        # ignoring any keys outside our field list
         self._fields = fields
         self._outFile = openFile(outFile,mode,newline='')
-        self._outWriter = csv.writer(self._outFile)
+        self._outWriter = csv.DictWriter(self._outFile, fieldnames=fields,
+                                         extrasaction='ignore', restval=None)
+        self._buf = []
         # Write Header
         if '+' not in mode:
-            self._outWriter.writerow(self._fields)
+            self._outWriter.writeheader()
 
         debugMessage("Setup CSV File '%s' with fields: %s'" % (outFile, fields), 1)
 
     def writerow(self, dictRow):
-        # Convert dictionary to ordered list
-        listRow = []
-        for field in self._fields:
-            # Add value if it exists in dictionary
-            if field in dictRow.keys():
-                debugMessage("Found value for '%s' = '%s'" % (field, dictRow[field]), 20)
-                listRow.append(dictRow[field])
-            # Otherwise, add a blank record
-            else:
-                debugMessage("No value found for '%s'. Printing blank field.", 20)
-                listRow.append(None)
-
-        # Write row to CSV
-        debugMessage("Attempting to write: %s" % listRow, 15)
-        self._outWriter.writerow(listRow)
+        # Buffer the row; many small writerow calls are far slower than one
+        # batched writerows
+        debugMessage("Attempting to write: %s" % dictRow, 15)
+        self._buf.append(dictRow)
+        if len(self._buf) >= self.FLUSHEVERY:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._outWriter.writerows(self._buf)
+            self._buf = []
 
     def close(self):
+        self.flush()
         self._outFile.close()
         
                 
         
-class textTree:
-    openLevel = "["
-    closeLevel = "]"
-    ignoreBetween = "\""
-    _currPos = 0
-    _text = ""
-
-    def __init__(self, text, currPos = -1, openLevel="[", closeLevel="]", ignoreBetween="\""):
-        self._text = text
-        self.openLevel = openLevel
-        self.closeLevel = closeLevel
-        self.ignoreBetween = ignoreBetween
-        
-        if currPos == -1 or currPos >= len(text):
-            self._currPos = len(text)-1
+def parseJsonEntry(jsonEntry):
+
+    # Rebuild the flat key/value string into a valid JSON object and parse it.
+    # If the entry is truncated (partial file, or a nested record cut short),
+    # retry with the trailing incomplete pair(s) dropped.
+    record = None
+    while record is None:
+        try:
+            record = orjson.loads(b'{' + jsonEntry + b'}')
+        except (orjson.JSONDecodeError, UnicodeDecodeError):
+            # stdlib json raises UnicodeDecodeError (not a JSONDecodeError)
+            # when the truncation point lands inside a UTF-8 sequence
+            lastComma = jsonEntry.rfind(b',')
+            if lastComma == -1:
+                debugMessage("Could not parse entry: %s" % jsonEntry, 5)
+                return {}
+            jsonEntry = jsonEntry[:lastComma]
+
+    # Write fields to dictionary
+    UrlRecord = {}
+    for key, value in record.items():
+        if key in FIELDS:
+            UrlRecord[key] = value
+            debugMessage("\tADDED\t%s: %s" % (key, value), 15)
         else:
-            self._currPos = currPos
+            debugMessage("\tIGNORED\t%s: %s" % (key, value), 15)
+
+    # Return dictionary
+    return UrlRecord
 
-    def nextUpTreeReverse(self):
 
-        # Navigate back down string tree, work out full tree path to current node
-        treeLevel = 0
 
-        # Start just before selected location
-        debugMessage("Finding previous opening bracket from offset %d" % (self._currPos), 20)
+# Event codes emitted by the scanner state machines below
+_EV_PUSH, _EV_POP, _EV_START, _EV_END, _EV_LASTUPDATE = 0, 1, 2, 3, 4
 
-        while self._currPos > 0:
 
-                # If we find the next level, we're done
-                if treeLevel < 0:
-                        debugMessage("Found matching bracket")
+"""
+Pure-Python scanner state machine. Walks the blob once and yields
+(code, a, b) events: PUSH of the array name jsonBlob[a:b] on '[', POP on
+']', START of a url object at offset a, END just past its closing brace
+at offset a, and LASTUPDATE with a candidate date value starting at
+offset a. Quoted strings are skipped (honouring backslash
+escapes) and the most recent one is remembered, in case it turns out to
+be the key naming an array.
+"""
+def _scanEventsPy(jsonBlob):
+    openDepths = []     # depths of url objects awaiting their "}"
+    keyStart = keyEnd = 0
+    depth = 0
+    i = 0
+    n = len(jsonBlob)
+
+    while i < n:
+        currChar = jsonBlob[i]
+
+        if currChar == _QUOTE:
+            # Jump quote-to-quote with bytes.find (memchr speed) rather
+            # than stepping a byte at a time; a quote is escaped iff an
+            # odd run of backslashes precedes it
+            j = i
+            while True:
+                j = jsonBlob.find(b'"', j+1)
+                if j == -1:
+                    j = n
+                    break
+                k = j - 1
+                while jsonBlob[k] == _BACKSLASH:
+                    k -= 1
+                if (j - k) % 2 == 1:
+                    break
+            keyStart, keyEnd = i+1, j
+            # A "lastUpdate" key means its value may be the session date -
+            # it sits right after the closing quote and the ':'
+            if jsonBlob[i+1:j] == _LASTUPDATE_KEY:
+                yield (_EV_LASTUPDATE, j+2, 0)
+            i = j + 1
+            continue
+
+        elif currChar == _OPEN_BRACE:
+            depth += 1
+            # An object whose first key is "url" is an entry we want
+            if jsonBlob[i+1:i+7] == _URL_KEY:
+                yield (_EV_START, i, 0)
+                openDepths.append(depth)
+
+        elif currChar == _CLOSE_BRACE:
+            # Closing bracket for the most recently opened URL entry?
+            if openDepths and openDepths[-1] == depth:
+                openDepths.pop()
+                yield (_EV_END, i+1, 0)
+            depth -= 1
+
+        elif currChar == _OPEN_BRACKET:
+            depth += 1
+            yield (_EV_PUSH, keyStart, keyEnd)
+
+        elif currChar == _CLOSE_BRACKET:
+            depth -= 1
+            yield (_EV_POP, 0, 0)
+
+        i += 1
+
+
+if njit != None:
+    # Compiled transcription of _scanEventsPy: takes the blob as a uint8
+    # array plus a preallocated (maxEvents, 3) int64 array, fills it with
+    # the same events and returns the number of rows used
+    @njit(cache=True)
+    def _scanEventsNative(buf, events):
+        openDepths = numpy.empty(64, numpy.int64)   # grown on demand
+        sp = 0
+        used = 0
+        keyStart = keyEnd = 0
+        depth = 0
+        i = 0
+        n = buf.shape[0]
+
+        while i < n:
+            currChar = buf[i]
+
+            if currChar == _QUOTE:
+                j = i + 1
+                while j < n:
+                    if buf[j] == _BACKSLASH:
+                        j += 2
+                    elif buf[j] == _QUOTE:
                         break
+                    else:
+                        j += 1
+                keyStart, keyEnd = i+1, j
+                # Is this a "lastUpdate" key? (108,97,115,116,85,112,
+                # 100,97,116,101 = b'lastUpdate')
+                if (j - i == 11 and buf[i+1] == 108 and buf[i+2] == 97
+                        and buf[i+3] == 115 and buf[i+4] == 116
+                        and buf[i+5] == 85 and buf[i+6] == 112
+                        and buf[i+7] == 100 and buf[i+8] == 97
+                        and buf[i+9] == 116 and buf[i+10] == 101):
+                    events[used,0] = _EV_LASTUPDATE
+                    events[used,1] = j+2; used += 1
+                i = j + 1
+                continue
+
+            elif currChar == _OPEN_BRACE:
+                depth += 1
+                # Does `"url":` follow? (34,117,114,108,34,58 = b'"url":')
+                if (i+7 <= n and buf[i+1] == 34 and buf[i+2] == 117
+                        and buf[i+3] == 114 and buf[i+4] == 108
+                        and buf[i+5] == 34 and buf[i+6] == 58):
+                    events[used,0] = _EV_START; events[used,1] = i; used += 1
+                    # Grow the stack when full - dropping a push would
+                    # misalign every later END against the replay's stack
+                    if sp == openDepths.shape[0]:
+                        grown = numpy.empty(openDepths.shape[0] * 2, numpy.int64)
+                        for t in range(sp):
+                            grown[t] = openDepths[t]
+                        openDepths = grown
+                    openDepths[sp] = depth; sp += 1
+
+            elif currChar == _CLOSE_BRACE:
+                if sp > 0 and openDepths[sp-1] == depth:
+                    sp -= 1
+                    events[used,0] = _EV_END; events[used,1] = i+1; used += 1
+                depth -= 1
+
+            elif currChar == _OPEN_BRACKET:
+                depth += 1
+                events[used,0] = _EV_PUSH
+                events[used,1] = keyStart; events[used,2] = keyEnd
+                used += 1
+
+            elif currChar == _CLOSE_BRACKET:
+                depth -= 1
+                events[used,0] = _EV_POP; used += 1
+
+            i += 1
+
+        return used
 
-                # Otherwise, take a look at the previous character
-                self._currPos -= 1
-                currChar = self._text[self._currPos]
-
-                # If we come across an "ignoreBetween" character, skip back until
-                # the matching character - this is to ignore quoted sections
-                if currChar in self.ignoreBetween:
-                        matchingQuote = self._text.rfind(currChar, 0, self._currPos)
-                        self._currPos = matchingQuote - 1
-                        continue
-
-                # Otherwise, we only care about opening/closing brackets
-                elif currChar in self.openLevel:
-                    treeLevel -= 1
-                elif currChar in self.closeLevel:
-                    treeLevel += 1
-        
+
+"""
+Walk the blob (a bytes-like object) in a single pass and return
+(entryStarts, entryEnds, treePaths, lastUpdateMS) - two int64 arrays and
+a list of strings, one slot per object whose first key is "url", where
+jsonBlob[entryStarts[i]:entryEnds[i]] is the full object (end is
+exclusive, just past the closing brace; for a record cut short by EOF it
+is len(jsonBlob)+1, i.e. just past where the brace should have been, so
+slicing to end-1 always keeps every byte that is actually there).
+lastUpdateMS is the session's lastUpdate value in
+milliseconds, or None if the blob has no lastUpdate marker. Offsets live
+in array.array('q') rather than lists
+of boxed ints - 8 bytes per offset instead of ~28. Uses the
+numba-compiled state machine when numba is installed, otherwise the
+pure-Python one.
+"""
+def scanJsonEntries(jsonBlob, pbar=None):
+    n = len(jsonBlob)
+
+    if njit != None:
+        buf = numpy.frombuffer(jsonBlob, numpy.uint8)
+        # Every '[' / ']' / '{' produces at most one PUSH / POP / START+END,
+        # and every quoted string at most one LASTUPDATE
+        maxEvents = int((buf == _OPEN_BRACKET).sum()) \
+                  + int((buf == _CLOSE_BRACKET).sum()) \
+                  + 2 * int((buf == _OPEN_BRACE).sum()) \
+                  + int((buf == _QUOTE).sum()) // 2 + 1
+        events = numpy.empty((maxEvents, 3), numpy.int64)
+        used = _scanEventsNative(buf, events)
+        eventStream = events[:used]
+    else:
+        eventStream = _scanEventsPy(jsonBlob)
+
+    # Replay the event stream, building tree paths forward as we go
+    entryStarts = array.array('q')
+    entryEnds = array.array('q')
+    treePaths = []
+    lastUpdateMS = None
+    openEntries = []    # indices of url entries awaiting their END event
+    pathStack = []      # names of the arrays we are currently inside
+
+    # Throttle feedback to ~100 updates however many entries there are -
+    # every ProgressBar.update formats widgets and writes to stderr
+    pbarStep = max(1, n // 100)
+    pbarLast = 0
+
+    for code, a, b in eventStream:
+        if code == _EV_PUSH:
+            pathStack.append(jsonBlob[a:b].decode('utf-8', 'replace'))
+        elif code == _EV_POP:
+            if pathStack: pathStack.pop()
+        elif code == _EV_START:
+            entryStarts.append(a)
+            entryEnds.append(n)
+            treePaths.append(''.join(name + '/' for name in pathStack))
+            openEntries.append(len(entryStarts)-1)
+            if pbar != None and a - pbarLast >= pbarStep:
+                pbar.update(a)
+                pbarLast = a
+        elif code == _EV_END:
+            entryEnds[openEntries.pop()] = a
+        elif lastUpdateMS == None:
+            # Candidate lastUpdate value: accept the first run of digits
+            # that is terminated by '}' (same shape the old regex required)
+            k = a
+            while k < n and 0x30 <= jsonBlob[k] <= 0x39:
+                k += 1
+            if k > a and k < n and jsonBlob[k] == _CLOSE_BRACE:
+                lastUpdateMS = int(jsonBlob[a:k])
+
+    # Entries still open at EOF never got their closing brace; mark their
+    # end as one past the blob so end-1 doesn't eat the last real byte
+    for entryIndex in openEntries:
+        entryEnds[entryIndex] = n + 1
+
+    return entryStarts, entryEnds, treePaths, lastUpdateMS
 
 
-def parseJsonEntry(jsonEntry):
 
-    # Treat jsonEntry as CSV, to separate out each key/value pair
-    lineRead = csv.reader([jsonEntry])
-    for arrEntry in lineRead:
+"""
+Recursively walk a parsed JSON tree, appending a record (the FIELDS
+present, plus Path) to records for every dict that has a "url" key.
+As in the scanner, arrays contribute their key name to Path. Returns the
+first lastUpdate value encountered (milliseconds), or None.
+"""
+def walkJsonTree(node, pathStack, records):
+    lastUpdateMS = None
+
+    if isinstance(node, dict):
+        if 'url' in node:
+            rec = {key: node[key] for key in FIELDS if key in node}
+            rec['Path'] = ''.join(name + '/' for name in pathStack)
+            records.append(rec)
+        for key, value in node.items():
+            if key == 'lastUpdate' and isinstance(value, int):
+                if lastUpdateMS == None: lastUpdateMS = value
+            elif isinstance(value, list):
+                pathStack.append(key)
+                found = walkJsonTree(value, pathStack, records)
+                pathStack.pop()
+                if lastUpdateMS == None: lastUpdateMS = found
+            elif isinstance(value, dict):
+                found = walkJsonTree(value, pathStack, records)
+                if lastUpdateMS == None: lastUpdateMS = found
+
+    elif isinstance(node, list):
+        for item in node:
+            found = walkJsonTree(item, pathStack, records)
+            if lastUpdateMS == None: lastUpdateMS = found
+
+    return lastUpdateMS
+
 
-        # For each field, read fields as CSV with ":" separator
-        fields = csv.reader(arrEntry, delimiter=":")
 
-        # Write fields to dictionary
-        UrlRecord = {}
-        for field in fields:
-            key = field[0].strip('\{\[\"')
-            value = field[1].strip('\{\[\"')
+def findJsonEntries(jsonBlob, showFeedback=True, csvWriter=None):
+
+    # Intact files (the common case) parse in one shot with the native JSON
+    # parser; only truncated/partial files need the recovery scanner. A
+    # truncation point inside a UTF-8 sequence surfaces as
+    # UnicodeDecodeError from stdlib json, so catch that too.
+    try:
+        if isinstance(jsonBlob, (bytes, bytearray, str)):
+            root = orjson.loads(jsonBlob)
+        elif HAVEORJSON:
+            # orjson takes any buffer (e.g. an mmap view) zero-copy
+            root = orjson.loads(memoryview(jsonBlob))
+        else:
+            # stdlib json needs a real bytes object
+            root = orjson.loads(bytes(jsonBlob))
+    except (orjson.JSONDecodeError, UnicodeDecodeError):
+        debugMessage("Input is not intact JSON - falling back to the scanner", 1)
+        return findJsonEntriesScan(jsonBlob, showFeedback, csvWriter)
 
-            # Create record to hold entry
-            if key in FIELDS:
-                UrlRecord[key] = value
-                debugMessage("\tADDED\t%s: %s" % (key, value), 15)
-            else:
-                debugMessage("\tIGNORED\t%s: %s" % (key, value), 15)
+    debugMessage("Input parsed whole; walking the tree", 1)
+    records = []
+    lastUpdateMS = walkJsonTree(root, [], records)
 
-        # Return dictionary
-        return UrlRecord
+    strLastUpdated = ""
+    if lastUpdateMS != None:
+        strLastUpdated = intUnixMSToDateTime(lastUpdateMS)
+
+    for jsonEntry in records:
+        jsonEntry['lastUpdated'] = strLastUpdated
+        if csvWriter != None:
+            csvWriter.writerow(jsonEntry)
 
 
 
-def findJsonEntries(jsonBlob, showFeedback=True, csvWriter=None):
-    entryOffsets = []
+def findJsonEntriesScan(jsonBlob, showFeedback=True, csvWriter=None):
 
     # Do we need to show progress bars?
     if showFeedback and DEBUGLEVEL == 0: needFeedback = True
     else: needFeedback = False
 
     ##########################################
-    # RUN REGEX TO FIND ENTRIES
+    # RUN SINGLE-PASS SCAN TO FIND ENTRIES
     ##########################################
 
-    # Setup Progress Bar for Regex Search
+    # Setup Progress Bar for the scan
     if needFeedback:
         widgets = ['Running Search: ', Percentage(), ' ', Bar(), ETA()]
         pbar = ProgressBar(widgets=widgets, maxval=len(jsonBlob)).start()
+    else:
+        pbar = None
 
-    # First, find all occurances of `{"url":`
+    # Find all `{"url":` entries (and their tree paths) in one pass, which
+    # also spots the date/"lastupdate" (if there is one, it becomes the
+    # date for all entries found)
     debugMessage("Finding URL Entries", 1)
-    for result in re.finditer("\{\"url\"\:", jsonBlob):
-        if needFeedback: pbar.update(result.start())
-        entryOffsets.append(result.start())
-
-    # See if there's a date/"lastupdate" (if so, it becomes the date for all entries found)
-    lastUpdatePretext = "\"lastUpdate\":"
-    for result in re.finditer(lastUpdatePretext + "[0-9]*}", jsonBlob):
-        # Pull date/time value from string
-        dateTimeStart = result.start()+len(lastUpdatePretext)
-        dateTimeEnd = result.end()-1
-        strUnixDateTime = jsonBlob[dateTimeStart:dateTimeEnd]
-        # Convert to INT
-        intUnixDateTime = int(strUnixDateTime)
-        # and to printable string
-        strLastUpdated = intUnixMSToDateTime(intUnixDateTime)
+    entryStarts, entryEnds, treePaths, lastUpdateMS = scanJsonEntries(jsonBlob, pbar)
+
+    strLastUpdated = ""
+    if lastUpdateMS != None:
+        strLastUpdated = intUnixMSToDateTime(lastUpdateMS)
 
     ##########################################
     # PROCESS INDIVIDUAL ENTRIES
@@ -213,68 +487,44 @@ def findJsonEntries(jsonBlob, showFeedback=True, csvWriter=None):
     debugMessage("Processing URL Entries", 1)
     if needFeedback:
         widgets = ['Processing URL Entries: ', Percentage(), ' ', Bar(), ETA()]
-        pbar = ProgressBar(widgets=widgets, maxval=len(entryOffsets)).start()
+        pbar = ProgressBar(widgets=widgets, maxval=len(entryStarts)).start()
+
+    # Bind hot names to locals once - LOAD_FAST beats LOAD_GLOBAL and
+    # repeated attribute lookups on every iteration
+    numEntries = len(entryStarts)
+    pbarStep = max(1, numEntries // 100)
+    dbg = debugMessage
+    parseEntry = parseJsonEntry
+    writerow = csvWriter.writerow if csvWriter != None else None
 
     # Now, process each occurance
-    for i in range(len(entryOffsets)):
+    for i in range(numEntries):
 
-        if needFeedback and not (i % LOOPFEEDBACK): pbar.update(i)
+        if needFeedback and not (i % pbarStep): pbar.update(i)
 
-        debugMessage("%d/%d. Offset=%d" % (i+1, len(entryOffsets), entryOffsets[i]), 10)
+        # The scan already found the extent and tree path of each entry
+        start, end, treePath = entryStarts[i], entryEnds[i], treePaths[i]
 
-        # Start where the current "hit" was found
-        start = entryOffsets[i]
-        # End where the next hit is found (or, at the end of the string)
-        if len(entryOffsets)-1 == i:
-            end = len(jsonBlob)
-        else:
-            end = entryOffsets[i+1]
-        
-        # Starting with the opening "{", look for the matching closing bracket
-        treeLevel = 0
-        for currPos in range(start+1, end):
-            # If we've found the closing bracket for the current section, we're done.
-            if treeLevel < 0:
-                break
-            # Otherwise, find the closing bracket!
-            if jsonBlob[currPos] == '{':
-                treeLevel += 1
-            if jsonBlob[currPos] == '}':
-                treeLevel -= 1
-
-        end = currPos
-
-        # Strip leading and closing characters
+        dbg("%d/%d. Offset=%d" % (i+1, numEntries, start), 10)
+
+        # The scan counted the braces, so just slice between them - no
+        # strip() call, no extra allocation. (For a record cut short by
+        # EOF, end is one past the blob, so end-1 keeps every real byte.)
         # strJsonEntry should be a flat string something like:
         # "url":"http://ebay","title":"My eBay: Messages: Inbox","subframe":true,"ID":1471
-        strJsonEntry = jsonBlob[start:end].strip("\{\}\[\]")
-        debugMessage("Found JSON Entry: %s" % jsonBlob[start:end], 10)
+        strJsonEntry = jsonBlob[start+1:end-1]
+        dbg("Found JSON Entry: %s" % strJsonEntry, 10)
 
         # Convert string jsonEntry to Dictionary
-        jsonEntry = parseJsonEntry(strJsonEntry)
-
-        # Navigate back down JSON string to work out path to current node
-        treePath = ""
-        tt = textTree(jsonBlob, currPos=start,openLevel="[",closeLevel="]")
-        
-        while tt._currPos > 0:
-                
-                # Find the previous opening bracket
-                tt.nextUpTreeReverse()
-                if tt._currPos == 0: break
-                
-                # Get the name of this node
-                startNodeName = jsonBlob.rfind('"', 0, tt._currPos-len('":['))+1
-                nodeName = jsonBlob[startNodeName:tt._currPos-len('":')]
-                treePath = '%s/%s' % (nodeName, treePath)
+        jsonEntry = parseEntry(strJsonEntry)
 
         # Set additional fields
         jsonEntry['Path'] = treePath
         jsonEntry['lastUpdated'] = strLastUpdated
 
         # Print to CSV
-        if csvWriter != None:
-            csvWriter.writerow(jsonEntry)
+        if writerow != None:
+            writerow(jsonEntry)
        
 
 
@@ -286,15 +536,21 @@ if __name__ == '__main__':
     print(intUnixMSToDateTime(1289247439269))
     # Open input/output files
     debugMessage("Opening Required Files", 1)
-    inFile = open('sessionstore.js', 'r')
     outWriter = csvWriter(FIELDS, 'sessionstore.js.csv')
 
-    # Read all '{"url":' entries in input file
+    # Map the input file instead of reading it into a string - the parser
+    # and scanner both work directly on the mapped bytes view
     debugMessage("Reading JSON Entries", 1)
-    entries = findJsonEntries(inFile.read(), csvWriter=outWriter)
+    with open('sessionstore.js', 'rb') as inFile:
+        # mmap refuses zero-byte files; an empty sessionstore is still
+        # valid input and just yields a header-only CSV
+        if os.fstat(inFile.fileno()).st_size == 0:
+            findJsonEntries(b"", csvWriter=outWriter)
+        else:
+            with mmap.mmap(inFile.fileno(), 0, access=mmap.ACCESS_READ) as jsonBlob:
+                findJsonEntries(jsonBlob, csvWriter=outWriter)
 
     # Cleanup
-    inFile.close()
     outWriter.close()
     debugMessage("Done.", 1)
 